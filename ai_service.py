@@ -4,53 +4,54 @@ AI Service module for handling Gemini API interactions with vector database cont
 from dotenv import load_dotenv
 import os
 import requests
-from vector_db import VectorDatabase
-from typing import Optional, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from corpus_manager import CorpusManager
+from session_store import SessionStore, Session, estimate_tokens
+from profiler import stage
+from typing import Optional, Dict, Any, List
 
 # Load environment variables
 load_dotenv(".env")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "1000"))
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "1800"))
+SESSION_HISTORY_TOKEN_BUDGET = int(os.getenv("SESSION_HISTORY_TOKEN_BUDGET", "1500"))
+# Number of most recent turns that are never compacted into the summary
+SESSION_KEEP_RECENT_TURNS = 2
 
 class AIService:
     def __init__(self):
         """Initialize the AI service with vector database."""
-        self.vector_db = None
+        self.corpora = CorpusManager()
         self.is_initialized = False
+        self.sessions = SessionStore(max_sessions=SESSION_MAX_SESSIONS, ttl_seconds=SESSION_TTL_SECONDS)
+        # Compaction needs its own Gemini call, so it runs off the request path
+        self._compaction_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="session-compaction")
     
     def initialize(self):
-        """Initialize and populate the vector database with data."""
+        """Initialize and populate the default corpus. Other corpora are opened on first use."""
         if self.is_initialized:
             return
         
-        self.vector_db = VectorDatabase()
-        
-        data_file = "data/data.json"
-        if os.path.exists(data_file):
-            # Check if collection is empty
-            if self.vector_db.collection.count() == 0:
-                print("Populating vector database with coaching data...")
-                self.vector_db.load_and_index_data(data_file)
-            else:
-                print(f"Vector database already contains {self.vector_db.collection.count()} documents")
-        else:
-            print(f"Warning: {data_file} not found. Vector database will be empty.")
+        vector_db = self.corpora.populate_default()
+        print(f"Vector database contains {vector_db.collection.count()} documents")
         
         self.is_initialized = True
     
-    def get_relevant_context(self, query: str, max_length: int = 1000) -> str:
+    def get_relevant_context(self, query: str, max_length: int = 1000, corpus: Optional[str] = None) -> str:
         """Get relevant context for the query."""
         if not self.is_initialized:
             self.initialize()
         
-        return self.vector_db.get_enhanced_context(query, max_context_length=max_length)
+        return self.corpora.get(corpus).get_enhanced_context(query, max_context_length=max_length)
     
-    def make_gemini_request_with_context(self, prompt_text: str) -> Dict[str, Any]:
+    def make_gemini_request_with_context(self, prompt_text: str, corpus: Optional[str] = None) -> Dict[str, Any]:
         """Make a request to Gemini API with relevant context from vector database."""
         if not self.is_initialized:
             self.initialize()
         
         # Get relevant context from vector database
-        relevant_context = self.vector_db.get_enhanced_context(prompt_text)
+        relevant_context = self.corpora.get(corpus).get_enhanced_context(prompt_text)
         
         # Create enhanced prompt with context
         if relevant_context:
@@ -66,6 +67,118 @@ class AIService:
         
         return self._make_gemini_request(enhanced_prompt, context_used=relevant_context)
     
+    def make_gemini_request_with_session(self, prompt_text: str, session_id: str,
+                                         corpus: Optional[str] = None, use_context: bool = True) -> Dict[str, Any]:
+        """Make a request to Gemini API within a conversation session.
+        
+        Part of the context window is kept for the previous turn's documents, the rest is
+        filled with documents relevant to the new question. Once the history exceeds the
+        token budget, older turns are compacted into a summary in the background, so a
+        turn or two may still be sent uncompacted while the summary is being written.
+        Without use_context only the history is sent, no retrieval is done.
+        Raises SessionNotFoundError if the session is unknown or expired.
+        """
+        if not self.is_initialized:
+            self.initialize()
+        
+        session = self.sessions.get(session_id)
+        vector_db = self.corpora.get(corpus) if use_context else None
+        with session.lock:
+            history = session.render_history()
+            
+            if not use_context:
+                plain_prompt = f"""Dosedanji pogovor z uporabnikom:
+            {history or 'Pogovor se šele začenja.'}
+            
+            Novo vprašanje oz. zahteva uporabnika je:
+            {prompt_text}"""
+                result = self._make_gemini_request(plain_prompt, context_used=None)
+                if result["success"]:
+                    self._record_turn(session, prompt_text, result["response"])
+                result["session_id"] = session.session_id
+                return result
+            
+            # Context retrieved from another corpus is not reused
+            if session.corpus != vector_db.collection_name:
+                session.context_docs = []
+                session.corpus = vector_db.collection_name
+            
+            context_docs = vector_db.get_incremental_context(prompt_text, session.context_docs)
+            relevant_context = vector_db.format_context(context_docs)
+            
+            enhanced_prompt = f"""Odgovarjaj kot AI pomočnik za uporabnike na spletni strani. Če podatke iz konteksta ne moreš pridobiti, odgovori 'Na vprašanje žal ne znam odgovoriti.' 
+            Dosedanji pogovor z uporabnikom:
+            {history or 'Pogovor se šele začenja.'}
+            
+            Novo vprašanje oz. zahteva uporabnika je:
+            {prompt_text}
+            
+            Za odgovor lahko uporabiš naslednji kontekst, ki je bil pridobljen iz baze podatkov:
+            VSEBINA:
+            {relevant_context}"""
+            
+            result = self._make_gemini_request(enhanced_prompt, context_used=relevant_context)
+            
+            if result["success"]:
+                session.context_docs = context_docs
+                self._record_turn(session, prompt_text, result["response"])
+        
+        result["session_id"] = session.session_id
+        return result
+    
+    def _record_turn(self, session: Session, question: str, answer: str):
+        """Add a turn to the session and schedule compaction once over budget. Call with session.lock held."""
+        session.add_turn(question, answer)
+        if session.history_tokens() > SESSION_HISTORY_TOKEN_BUDGET and not session.compacting:
+            session.compacting = True
+            self._compaction_executor.submit(self._compact_session, session)
+    
+    def end_session(self, session_id: str) -> bool:
+        """Drop a conversation session. Returns True if it existed."""
+        return self.sessions.delete(session_id)
+    
+    def _compact_session(self, session: Session):
+        """Compact older turns of a session into its summary."""
+        try:
+            with session.lock:
+                old_turns = session.turns[:-SESSION_KEEP_RECENT_TURNS]
+                previous_summary = session.summary
+            if old_turns:
+                summary = self._summarize_turns(previous_summary, old_turns)
+                with session.lock:
+                    # Turns are only ever appended, so the compacted ones are still the oldest
+                    session.summary = summary
+                    session.turns = session.turns[len(old_turns):]
+        finally:
+            session.compacting = False
+    
+    def _summarize_turns(self, previous_summary: str, old_turns: List[Dict[str, str]]) -> str:
+        """Summarize older turns together with the previous summary."""
+        transcript = "\n".join(
+            f"Uporabnik: {turn['question']}\nPomočnik: {turn['answer']}" for turn in old_turns
+        )
+        summary_prompt = f"""Na kratko povzemi naslednji pogovor med uporabnikom in AI pomočnikom. Ohrani vsa dejstva, ki bi lahko bila pomembna za nadaljnja vprašanja.
+            Dosedanji povzetek:
+            {previous_summary or '/'}
+            
+            Pogovor:
+            {transcript}"""
+        
+        result = self._make_gemini_request(summary_prompt)
+        if result["success"]:
+            summary = result["response"].strip()
+        else:
+            # Fall back to keeping only the questions when the summary request fails
+            questions = " | ".join(turn["question"] for turn in old_turns)
+            summary = f"{previous_summary} | {questions}" if previous_summary else questions
+        
+        # Never let the summary itself outgrow half of the budget
+        max_summary_chars = SESSION_HISTORY_TOKEN_BUDGET * 2
+        if estimate_tokens(summary) > SESSION_HISTORY_TOKEN_BUDGET // 2:
+            summary = summary[-max_summary_chars:]
+        
+        return summary
+    
     def make_gemini_request(self, prompt_text: str) -> Dict[str, Any]:
         """Make a request to Gemini API without context."""
         return self._make_gemini_request(prompt_text, context_used=None)
@@ -90,7 +203,8 @@ class AIService:
         }
         
         try:
-            response = requests.post(url, headers=headers, json=data)
+            with stage("gemini_request"):
+                response = requests.post(url, headers=headers, json=data)
             response.raise_for_status()
             
             result = response.json()
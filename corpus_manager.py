@@ -0,0 +1,107 @@
+"""
+Corpus manager module for serving several document collections from one deployment.
+
+Each corpus is an existing Chroma collection, populated with `db_manager.py index` or
+`db_manager.py import`. Requests never create or index collections.
+
+There is no memory budget: with chromadb 1.0.15 a collection's index stays in memory
+from its first query until the worker exits, whatever the cache settings. A worker's
+memory therefore grows with the number of distinct corpora it serves, so route corpora
+to workers to bound it. The per-corpus index sizes reported are estimates, not
+measurements.
+"""
+import chromadb
+import os
+import re
+import threading
+import time
+from chromadb.errors import NotFoundError
+from vector_db import VectorDatabase
+from typing import Dict, Any, Optional
+
+DEFAULT_CORPUS = "basketball_coaching"
+DEFAULT_DATA_FILE = "data/data.json"
+# Chroma requires collection names of at least 3 characters
+CORPUS_NAME_PATTERN = re.compile(r"^[a-zA-Z0-9][a-zA-Z0-9_-]{2,62}$")
+
+
+class CorpusNotFoundError(Exception):
+    """Raised when a requested corpus has no collection."""
+
+
+class CorpusManager:
+    def __init__(self, persist_directory: str = "./chroma_db"):
+        """Initialize the corpus manager. Collections are opened lazily on first use."""
+        self.persist_directory = persist_directory
+        self.client = None
+        self._opened: Dict[str, VectorDatabase] = {}
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _get_client(self):
+        """Create the shared ChromaDB client on first use."""
+        if self.client is None:
+            self.client = chromadb.PersistentClient(path=self.persist_directory)
+        return self.client
+
+    def populate_default(self) -> VectorDatabase:
+        """Create and index the default corpus if it is empty. Meant for startup, not requests."""
+        vector_db = VectorDatabase(collection_name=DEFAULT_CORPUS, client=self._get_client())
+        if vector_db.collection.count() == 0:
+            if os.path.exists(DEFAULT_DATA_FILE):
+                print("Populating vector database with coaching data...")
+                vector_db.load_and_index_data(DEFAULT_DATA_FILE)
+            else:
+                print(f"Warning: {DEFAULT_DATA_FILE} not found. Vector database will be empty.")
+        return vector_db
+
+    def get(self, corpus: Optional[str] = None) -> VectorDatabase:
+        """Return the vector database of an existing corpus."""
+        corpus = corpus or DEFAULT_CORPUS
+        if not CORPUS_NAME_PATTERN.match(corpus):
+            raise CorpusNotFoundError(f"Invalid corpus name '{corpus}'")
+
+        with self._lock:
+            # Look the collection up by name on every request: `db_manager.py import --replace`
+            # and `clear --yes` recreate it under a new id, which would break a cached handle
+            try:
+                collection = self._get_client().get_collection(name=corpus)
+            except NotFoundError:
+                self._opened.pop(corpus, None)
+                raise CorpusNotFoundError(f"Corpus '{corpus}' not found") from None
+
+            vector_db = self._opened.get(corpus)
+            if vector_db is None:
+                start = time.perf_counter()
+                vector_db = VectorDatabase(collection_name=corpus, client=self._get_client())
+                self._opened[corpus] = vector_db
+                stats = self._stats.setdefault(corpus, {"requests": 0, "reopens": 0})
+                stats["open_ms"] = (time.perf_counter() - start) * 1000
+            elif vector_db.collection.id != collection.id:
+                vector_db.collection = collection
+                self._stats[corpus]["reopens"] += 1
+
+            stats = self._stats[corpus]
+            stats["requests"] += 1
+            stats["last_used"] = time.time()
+            return vector_db
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Per-corpus stats of the corpora opened by this worker."""
+        with self._lock:
+            opened = dict(self._opened)
+            corpora = {corpus: dict(stats) for corpus, stats in self._stats.items()}
+
+        for corpus, vector_db in opened.items():
+            try:
+                corpora[corpus]["documents"] = vector_db.collection.count()
+                corpora[corpus]["estimated_index_bytes"] = vector_db.estimated_index_bytes()
+            except NotFoundError:  # Recreated since its last request, refreshed on the next one
+                pass
+
+        # Most recently used first
+        corpora = dict(sorted(corpora.items(), key=lambda item: item[1]["last_used"], reverse=True))
+        return {
+            "estimated_index_bytes": sum(stats.get("estimated_index_bytes", 0) for stats in corpora.values()),
+            "corpora": corpora
+        }
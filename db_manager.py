@@ -1,75 +1,168 @@
 #!/usr/bin/env python3
 """
 Utility script for managing the vector database.
-Run this script to initialize, test, or manage your vector database.
+Run this script to index, sync, inspect, search, clear, export or import your vector database.
+
+Examples:
+    python db_manager.py index
+    python db_manager.py sync --data data/data.json
+    python db_manager.py stats
+    python db_manager.py search "licence za trenerje" --bench 20
+    python db_manager.py clear --yes
+    python db_manager.py export snapshot.npz
+    python db_manager.py import snapshot.npz
 """
 
 from vector_db import VectorDatabase
+import argparse
 import os
+import sys
+import time
+
+DEFAULT_DATA_FILE = "data/data.json"
+
+def cmd_index(vector_db: VectorDatabase, args) -> int:
+    """Embed and index every document from the data file."""
+    if not os.path.exists(args.data):
+        print(f"Error: {args.data} not found!", file=sys.stderr)
+        return 1
+
+    print("Loading and indexing data...")
+    vector_db.load_and_index_data(args.data)
+    return 0
+
+def cmd_sync(vector_db: VectorDatabase, args) -> int:
+    """Embed only new or changed documents and drop the ones no longer in the data file."""
+    if not os.path.exists(args.data):
+        print(f"Error: {args.data} not found!", file=sys.stderr)
+        return 1
+
+    result = vector_db.sync_data(args.data)
+    print(f"Sync done: {result['upserted']} upserted, {result['deleted']} deleted, {result['unchanged']} unchanged")
+    return 0
+
+def cmd_stats(vector_db: VectorDatabase, args) -> int:
+    """Show document count and a sample of the collection."""
+    count = vector_db.collection.count()
+    print(f"Database contains {count} documents")
+
+    if count > 0 and args.sample > 0:
+        # Show sample of metadata
+        sample = vector_db.collection.peek(limit=args.sample)
+        print("\nSample documents:")
+        for i, (doc, meta) in enumerate(zip(sample['documents'], sample['metadatas'])):
+            print(f"{i+1}. [{meta.get('title', 'N/A')}] {doc[:100]}...")
+    return 0
+
+def cmd_search(vector_db: VectorDatabase, args) -> int:
+    """Search the collection and optionally benchmark the query."""
+    print(f"Searching for: '{args.query}'")
+    results = vector_db.search_relevant_context(args.query, n_results=args.n_results)
+
+    for i, result in enumerate(results, 1):
+        print(f"\n--- Result {i} ---")
+        print(f"Title: {result['metadata'].get('title', 'N/A')}")
+        print(f"Type: {result['metadata'].get('type', 'N/A')}")
+        print(f"Similarity: {result['similarity_score']:.3f}")
+        print(f"Content: {result['content'][:200]}...")
+
+    if args.bench:
+        # The search above already warmed up the model, so timings exclude loading it
+        timings = []
+        for _ in range(args.bench):
+            start = time.perf_counter()
+            vector_db.search_relevant_context(args.query, n_results=args.n_results)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        timings.sort()
+        p50 = timings[len(timings) // 2]
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        print(f"\nBenchmark ({args.bench} runs): "
+              f"mean {sum(timings) / len(timings):.2f} ms, p50 {p50:.2f} ms, "
+              f"p95 {p95:.2f} ms, max {timings[-1]:.2f} ms")
+    return 0
+
+def cmd_clear(vector_db: VectorDatabase, args) -> int:
+    """Clear all documents from the collection."""
+    if not args.yes:
+        print("Refusing to clear the database without --yes", file=sys.stderr)
+        return 1
+
+    vector_db.clear_collection()
+    return 0
+
+def cmd_export(vector_db: VectorDatabase, args) -> int:
+    """Export the collection to a binary snapshot."""
+    # numpy appends .npz to paths without it, so report the file that is actually written
+    path = args.path if args.path.endswith(".npz") else f"{args.path}.npz"
+    count = vector_db.export_snapshot(path)
+    print(f"Exported {count} documents to {path}")
+    return 0
+
+def cmd_import(vector_db: VectorDatabase, args) -> int:
+    """Import a binary snapshot into the collection."""
+    if not os.path.exists(args.path):
+        print(f"Error: {args.path} not found!", file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    # Validate the whole snapshot before touching the collection
+    try:
+        snapshot = VectorDatabase.load_snapshot(args.path)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    count = vector_db.import_snapshot(snapshot, replace=args.replace)
+    print(f"Imported {count} documents in {time.perf_counter() - start:.2f} s")
+    return 0
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the argument parser with all subcommands."""
+    parser = argparse.ArgumentParser(description="Vector Database Manager")
+    parser.add_argument("--collection", default="basketball_coaching", help="Collection name")
+    parser.add_argument("--persist-directory", default="./chroma_db", help="ChromaDB directory")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    index_parser = subparsers.add_parser("index", help="Embed and index all documents from the data file")
+    index_parser.add_argument("--data", default=DEFAULT_DATA_FILE, help="Path to the JSON data file")
+    index_parser.set_defaults(func=cmd_index)
+
+    sync_parser = subparsers.add_parser("sync", help="Index only new or changed documents, remove stale ones")
+    sync_parser.add_argument("--data", default=DEFAULT_DATA_FILE, help="Path to the JSON data file")
+    sync_parser.set_defaults(func=cmd_sync)
+
+    stats_parser = subparsers.add_parser("stats", help="Show database stats")
+    stats_parser.add_argument("--sample", type=int, default=5, help="Number of sample documents to show")
+    stats_parser.set_defaults(func=cmd_stats)
+
+    search_parser = subparsers.add_parser("search", help="Test search functionality")
+    search_parser.add_argument("query", help="Search query")
+    search_parser.add_argument("-n", "--n-results", type=int, default=3, help="Number of results")
+    search_parser.add_argument("--bench", type=int, default=0, metavar="RUNS",
+                               help="Repeat the search RUNS times and report latency")
+    search_parser.set_defaults(func=cmd_search)
+
+    clear_parser = subparsers.add_parser("clear", help="Clear database")
+    clear_parser.add_argument("--yes", action="store_true", help="Confirm clearing all data")
+    clear_parser.set_defaults(func=cmd_clear)
+
+    export_parser = subparsers.add_parser("export", help="Export the collection to a binary snapshot")
+    export_parser.add_argument("path", help="Snapshot file path (.npz is appended if missing)")
+    export_parser.set_defaults(func=cmd_export)
+
+    import_parser = subparsers.add_parser("import", help="Import a binary snapshot without re-embedding")
+    import_parser.add_argument("path", help="Snapshot file path (.npz)")
+    import_parser.add_argument("--replace", action="store_true",
+                               help="Replace the collection instead of merging into it")
+    import_parser.set_defaults(func=cmd_import)
+
+    return parser
 
-def main():
-    print("=== Vector Database Manager ===")
-    
-    # Initialize vector database
-    vector_db = VectorDatabase()
-    
-    while True:
-        print("\nOptions:")
-        print("1. Load data from data.json")
-        print("2. Test search functionality")
-        print("3. Show database stats")
-        print("4. Clear database")
-        print("5. Exit")
-        
-        choice = input("\nEnter your choice (1-5): ").strip()
-        
-        if choice == "1":
-            data_file = "data/data.json"
-            if os.path.exists(data_file):
-                print("Loading and indexing data...")
-                vector_db.load_and_index_data(data_file)
-                print("Data loaded successfully!")
-            else:
-                print(f"Error: {data_file} not found!")
-        
-        elif choice == "2":
-            query = input("Enter search query: ").strip()
-            if query:
-                print(f"\nSearching for: '{query}'")
-                results = vector_db.search_relevant_context(query, n_results=3)
-                
-                for i, result in enumerate(results, 1):
-                    print(f"\n--- Result {i} ---")
-                    print(f"Title: {result['metadata'].get('title', 'N/A')}")
-                    print(f"Type: {result['metadata'].get('type', 'N/A')}")
-                    print(f"Similarity: {result['similarity_score']:.3f}")
-                    print(f"Content: {result['content'][:200]}...")
-        
-        elif choice == "3":
-            count = vector_db.collection.count()
-            print(f"\nDatabase contains {count} documents")
-            
-            if count > 0:
-                # Show sample of metadata
-                sample = vector_db.collection.peek(limit=5)
-                print("\nSample documents:")
-                for i, (doc, meta) in enumerate(zip(sample['documents'], sample['metadatas'])):
-                    print(f"{i+1}. [{meta.get('title', 'N/A')}] {doc[:100]}...")
-        
-        elif choice == "4":
-            confirm = input("Are you sure you want to clear all data? (yes/no): ").strip().lower()
-            if confirm == "yes":
-                vector_db.clear_collection()
-                print("Database cleared!")
-            else:
-                print("Operation cancelled.")
-        
-        elif choice == "5":
-            print("Goodbye!")
-            break
-        
-        else:
-            print("Invalid choice. Please try again.")
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    vector_db = VectorDatabase(collection_name=args.collection, persist_directory=args.persist_directory)
+    return args.func(vector_db, args)
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -1,11 +1,16 @@
 """
 FastAPI application for the Basketball Coaching License Assistant.
 """
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Depends, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional
 from ai_service import ai_service
+from corpus_manager import CorpusNotFoundError
+from session_store import SessionNotFoundError
+from profiler import request_profiler
+import hmac
+import os
 import uvicorn
 
 # Create FastAPI app
@@ -28,6 +33,8 @@ app.add_middleware(
 class QueryRequest(BaseModel):
     query: str
     use_context: bool = True
+    session_id: Optional[str] = None
+    corpus: Optional[str] = None
 
 class QueryResponse(BaseModel):
     success: bool
@@ -35,10 +42,28 @@ class QueryResponse(BaseModel):
     context_used: bool
     context: Optional[str]
     error: Optional[str]
+    session_id: Optional[str] = None
+
+class SessionResponse(BaseModel):
+    session_id: str
+
+class ProfilingConfig(BaseModel):
+    enabled: bool
+    mode: str = "cprofile"
+    sample_percent: float = 1.0
+    sampling_interval: float = 0.005
+    trace_allocations: bool = False
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Allow the request only if it carries the ADMIN_TOKEN from the environment."""
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token or not x_admin_token or not hmac.compare_digest(x_admin_token, admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
 
 class ContextRequest(BaseModel):
     query: str
     max_length: int = 1000
+    corpus: Optional[str] = None
 
 class ContextResponse(BaseModel):
     context: str
@@ -62,6 +87,8 @@ async def root():
             "query": "/query - Ask questions with context",
             "query_simple": "/query-simple - Ask questions without context",
             "context": "/context - Get relevant context for a query",
+            "session": "/session - Start a conversation session (pass session_id to /query)",
+            "corpora": "/corpora - Per-corpus request and index size stats",
             "health": "/health - Health check"
         }
     }
@@ -86,13 +113,21 @@ async def query_with_context(request: QueryRequest):
         QueryResponse with the AI response and context information
     """
     try:
-        if request.use_context:
-            result = ai_service.make_gemini_request_with_context(request.query)
-        else:
-            result = ai_service.make_gemini_request(request.query)
+        with request_profiler.profile_request("query"):
+            if request.session_id:
+                result = ai_service.make_gemini_request_with_session(
+                    request.query, request.session_id,
+                    corpus=request.corpus, use_context=request.use_context
+                )
+            elif request.use_context:
+                result = ai_service.make_gemini_request_with_context(request.query, corpus=request.corpus)
+            else:
+                result = ai_service.make_gemini_request(request.query)
         
         return QueryResponse(**result)
     
+    except (CorpusNotFoundError, SessionNotFoundError) as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
@@ -108,8 +143,13 @@ async def query_simple(request: QueryRequest):
         Dict with just the response text
     """
     try:
-        if request.use_context:
-            result = ai_service.make_gemini_request_with_context(request.query)
+        if request.session_id:
+            result = ai_service.make_gemini_request_with_session(
+                request.query, request.session_id,
+                corpus=request.corpus, use_context=request.use_context
+            )
+        elif request.use_context:
+            result = ai_service.make_gemini_request_with_context(request.query, corpus=request.corpus)
         else:
             result = ai_service.make_gemini_request(request.query)
         
@@ -118,6 +158,8 @@ async def query_simple(request: QueryRequest):
         else:
             raise HTTPException(status_code=400, detail=result["error"])
     
+    except (CorpusNotFoundError, SessionNotFoundError) as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
@@ -133,9 +175,100 @@ async def get_context(request: ContextRequest):
         ContextResponse with the relevant context
     """
     try:
-        context = ai_service.get_relevant_context(request.query, request.max_length)
+        context = ai_service.get_relevant_context(request.query, request.max_length, corpus=request.corpus)
         return ContextResponse(context=context, query=request.query)
     
+    except CorpusNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@app.get("/api/corpora")
+async def corpora_stats():
+    """Per-corpus stats of this worker: requests, document counts and estimated index sizes."""
+    return ai_service.corpora.get_stats()
+
+@app.post("/api/session", response_model=SessionResponse)
+async def create_session():
+    """
+    Start a new conversation session.
+    
+    Returns:
+        SessionResponse with the id to pass as session_id to /query
+    """
+    session = ai_service.sessions.create()
+    return SessionResponse(session_id=session.session_id)
+
+@app.delete("/api/session/{session_id}")
+async def delete_session(session_id: str):
+    """
+    End a conversation session and drop its history.
+    
+    Args:
+        session_id: Id of the session to delete
+    """
+    if not ai_service.end_session(session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"deleted": session_id}
+
+@app.get("/api/admin/profiling", dependencies=[Depends(require_admin)])
+async def get_profiling_config():
+    """Get the current profiling configuration."""
+    return request_profiler.get_config()
+
+@app.put("/api/admin/profiling", dependencies=[Depends(require_admin)])
+async def set_profiling_config(config: ProfilingConfig):
+    """
+    Enable or disable profiling of /query requests.
+    
+    Args:
+        config: ProfilingConfig with the mode ("cprofile" or "sampling"), the percentage
+            of requests to profile and whether to trace allocations with tracemalloc
+    """
+    try:
+        request_profiler.configure(
+            enabled=config.enabled,
+            mode=config.mode,
+            sample_percent=config.sample_percent,
+            sampling_interval=config.sampling_interval,
+            trace_allocations=config.trace_allocations
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return request_profiler.get_config()
+
+@app.get("/api/admin/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles():
+    """List captured profiles with their stage breakdowns and allocation stats."""
+    return {"profiles": request_profiler.list_profiles()}
+
+@app.get("/api/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def download_profile(profile_id: str, format: str = "pstats"):
+    """
+    Download a captured profile.
+    
+    Args:
+        profile_id: Id of the profile
+        format: "pstats" (cProfile mode), "folded" (sampling mode, flamegraph-compatible)
+            or "text" (top functions of a cProfile result)
+    """
+    profile = request_profiler.get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    if format == "pstats" and "pstats" in profile:
+        return Response(
+            content=profile["pstats"],
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": f'attachment; filename="{profile_id}.pstats"'}
+        )
+    if format == "folded" and "folded" in profile:
+        return Response(
+            content=profile["folded"],
+            media_type="text/plain",
+            headers={"Content-Disposition": f'attachment; filename="{profile_id}.folded"'}
+        )
+    if format == "text" and "pstats" in profile:
+        return Response(content=request_profiler.top_functions(profile), media_type="text/plain")
+    
+    raise HTTPException(status_code=400, detail=f"Format '{format}' is not available for a {profile['mode']} profile")
@@ -0,0 +1,234 @@
+"""
+Profiler module for on-demand profiling of the request pipeline.
+
+Profiling is off by default. When disabled, `profile_request` and `stage` return a
+shared no-op context manager, so the hot path only pays for a single attribute check.
+"""
+import cProfile
+import contextvars
+import io
+import marshal
+import pstats
+import random
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter, deque
+from contextlib import contextmanager, nullcontext
+from typing import List, Dict, Any, Optional
+
+PROFILE_MODES = ("cprofile", "sampling")
+
+_NULL_CONTEXT = nullcontext()
+_current_profile: contextvars.ContextVar = contextvars.ContextVar("current_profile", default=None)
+
+
+class _StackSampler:
+    def __init__(self, thread_id: int, interval: float):
+        """Periodically sample the stack of one thread in a background thread."""
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+
+            # Key frames by function, not by current line, so samples of one function merge
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def folded(self) -> str:
+        """Samples in collapsed stack format, as used by flamegraph.pl and speedscope."""
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common()) + "\n"
+
+
+class _LoadedStats:
+    def __init__(self, stats: Dict[Any, Any]):
+        """Wrap already collected stats so pstats.Stats can load them like a Profile."""
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class RequestProfiler:
+    def __init__(self, max_profiles: int = 20):
+        """Initialize a disabled profiler that keeps the last max_profiles results."""
+        self.enabled = False
+        self.mode = "cprofile"
+        self.sample_percent = 1.0
+        self.sampling_interval = 0.005
+        self.trace_allocations = False
+        self.profiles: "deque[Dict[str, Any]]" = deque(maxlen=max_profiles)
+        # cProfile and tracemalloc are process-wide, so only one request is profiled at a time
+        self._busy = threading.Lock()
+
+    def configure(self, enabled: bool, mode: str = "cprofile", sample_percent: float = 1.0,
+                  sampling_interval: float = 0.005, trace_allocations: bool = False):
+        """Update the profiling configuration."""
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profiling mode '{mode}', expected one of {PROFILE_MODES}")
+        if not 0 <= sample_percent <= 100:
+            raise ValueError("sample_percent must be between 0 and 100")
+        if sampling_interval <= 0:
+            raise ValueError("sampling_interval must be positive")
+
+        self.mode = mode
+        self.sample_percent = sample_percent
+        self.sampling_interval = sampling_interval
+        self.trace_allocations = trace_allocations
+        self.enabled = enabled
+
+    def get_config(self) -> Dict[str, Any]:
+        """Return the current profiling configuration."""
+        return {
+            "enabled": self.enabled,
+            "mode": self.mode,
+            "sample_percent": self.sample_percent,
+            "sampling_interval": self.sampling_interval,
+            "trace_allocations": self.trace_allocations
+        }
+
+    def profile_request(self, name: str):
+        """Return a context manager that profiles the request if it is sampled."""
+        if not self.enabled or random.uniform(0, 100) >= self.sample_percent:
+            return _NULL_CONTEXT
+        return self._profile(name)
+
+    @contextmanager
+    def _profile(self, name: str):
+        if not self._busy.acquire(blocking=False):
+            yield
+            return
+
+        profile = {
+            "id": uuid.uuid4().hex,
+            "name": name,
+            "mode": self.mode,
+            "started_at": time.time(),
+            "stages": {}
+        }
+        token = _current_profile.set(profile)
+        started_tracing = False
+        profiler = None
+        sampler = None
+        try:
+            if self.trace_allocations and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+
+            if self.mode == "cprofile":
+                profiler = cProfile.Profile()
+                profiler.enable()
+            else:
+                sampler = _StackSampler(threading.get_ident(), self.sampling_interval)
+                sampler.start()
+
+            start = time.perf_counter()
+            try:
+                yield
+            finally:
+                profile["duration_ms"] = (time.perf_counter() - start) * 1000
+
+                if profiler is not None:
+                    profiler.disable()
+                    profiler.create_stats()
+                    profile["pstats"] = marshal.dumps(profiler.stats)
+                if sampler is not None:
+                    sampler.stop()
+                    profile["folded"] = sampler.folded()
+
+                if started_tracing:
+                    snapshot = tracemalloc.take_snapshot()
+                    current, peak = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+                    profile["allocations"] = {
+                        "current_bytes": current,
+                        "peak_bytes": peak,
+                        "top": [
+                            {"location": str(stat.traceback), "size_bytes": stat.size, "count": stat.count}
+                            for stat in snapshot.statistics("lineno")[:20]
+                        ]
+                    }
+
+                self.profiles.append(profile)
+        finally:
+            _current_profile.reset(token)
+            self._busy.release()
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        """Summaries of the captured profiles, newest first."""
+        return [
+            {
+                "id": profile["id"],
+                "name": profile["name"],
+                "mode": profile["mode"],
+                "started_at": profile["started_at"],
+                "duration_ms": profile.get("duration_ms"),
+                "stages": profile["stages"],
+                "allocations": profile.get("allocations")
+            }
+            for profile in reversed(self.profiles)
+        ]
+
+    def get_profile(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        """Return a captured profile by id."""
+        for profile in self.profiles:
+            if profile["id"] == profile_id:
+                return profile
+        return None
+
+    def top_functions(self, profile: Dict[str, Any], limit: int = 30) -> str:
+        """Render the hottest functions of a cProfile result as text."""
+        if "pstats" not in profile:
+            return ""
+
+        stream = io.StringIO()
+        stats = pstats.Stats(_LoadedStats(marshal.loads(profile["pstats"])), stream=stream)
+        stats.sort_stats("cumulative").print_stats(limit)
+        return stream.getvalue()
+
+
+def is_profiling() -> bool:
+    """Whether the current request is being profiled."""
+    return _current_profile.get() is not None
+
+
+def stage(name: str):
+    """Return a context manager that records the duration of a pipeline stage."""
+    profile = _current_profile.get()
+    if profile is None:
+        return _NULL_CONTEXT
+    return _record_stage(profile, name)
+
+
+@contextmanager
+def _record_stage(profile: Dict[str, Any], name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages = profile["stages"]
+        stages[name] = stages.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+
+# Create a global instance
+request_profiler = RequestProfiler()
@@ -0,0 +1,108 @@
+"""
+Session store module for keeping bounded, server-side conversation history.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+
+
+def estimate_tokens(text: str) -> int:
+    """Roughly estimate the number of tokens in a text (about 4 characters per token)."""
+    if not text:
+        return 0
+    return len(text) // 4 + 1
+
+
+class SessionNotFoundError(Exception):
+    """Raised when a session id is unknown or the session has expired."""
+
+
+class Session:
+    def __init__(self, session_id: str):
+        """Initialize an empty conversation session."""
+        self.session_id = session_id
+        self.turns: List[Dict[str, str]] = []
+        self.summary = ""
+        self.context_docs: List[Dict[str, Any]] = []
+        self.corpus: Optional[str] = None
+        self.compacting = False
+        self.last_access = time.monotonic()
+        self.lock = threading.Lock()
+
+    def add_turn(self, question: str, answer: str):
+        """Append a question/answer pair to the history."""
+        self.turns.append({"question": question, "answer": answer})
+
+    def history_tokens(self) -> int:
+        """Estimated token size of the summary plus all stored turns."""
+        total = estimate_tokens(self.summary)
+        for turn in self.turns:
+            total += estimate_tokens(turn["question"]) + estimate_tokens(turn["answer"])
+        return total
+
+    def render_history(self) -> str:
+        """Render the summary and turns as text for the prompt."""
+        parts = []
+        if self.summary:
+            parts.append(f"Povzetek prejšnjega pogovora: {self.summary}")
+        for turn in self.turns:
+            parts.append(f"Uporabnik: {turn['question']}\nPomočnik: {turn['answer']}")
+        return "\n\n".join(parts)
+
+
+class SessionStore:
+    def __init__(self, max_sessions: int = 1000, ttl_seconds: float = 1800):
+        """Initialize a bounded session store with idle-TTL eviction."""
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict_expired(self, now: float):
+        """Drop sessions that have been idle for longer than the TTL."""
+        # Sessions are kept in access order, so expired ones are at the front
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_access <= self.ttl_seconds:
+                break
+            self._sessions.popitem(last=False)
+
+    def create(self) -> Session:
+        """Create a new session with a server-generated id."""
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+
+            session = Session(uuid.uuid4().hex)
+            session.last_access = now
+            self._sessions[session.session_id] = session
+            # Evict least recently used sessions when over capacity
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return session
+
+    def get(self, session_id: str) -> Session:
+        """Return an existing session. Raises SessionNotFoundError if it is unknown or expired."""
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+
+            session = self._sessions.get(session_id)
+            if session is None:
+                raise SessionNotFoundError(f"Session '{session_id}' not found or expired")
+
+            self._sessions.move_to_end(session_id)
+            session.last_access = now
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        """Delete a session. Returns True if it existed."""
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._evict_expired(time.monotonic())
+            return len(self._sessions)
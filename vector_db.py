@@ -1,14 +1,58 @@
 import chromadb
+import hashlib
 import json
-from sentence_transformers import SentenceTransformer
+import numpy as np
 import os
-from typing import List, Dict, Any
+import threading
+from profiler import stage
+from typing import List, Dict, Any, Tuple
+
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'  # Lightweight multilingual model
+EMBEDDING_DIMENSION = 384
+SNAPSHOT_FORMAT_VERSION = 2
+
+_embedding_model = None
+_embedding_model_lock = threading.Lock()
+
+def get_embedding_model():
+    """Return the sentence transformer model shared by all collections, loading it on first use."""
+    global _embedding_model
+    with _embedding_model_lock:
+        if _embedding_model is None:
+            # Imported lazily so that snapshot import and stats don't pay for loading torch
+            from sentence_transformers import SentenceTransformer
+            _embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    return _embedding_model
+
+def _stable_id(prefix: str, *parts: str) -> str:
+    """Document id derived from its content, so it doesn't change when other documents move."""
+    digest = hashlib.sha1("\x00".join(parts).encode('utf-8')).hexdigest()[:16]
+    return f"{prefix}_{digest}"
+
+def _pack_strings(values: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Encode strings as one UTF-8 byte buffer plus an array of end offsets."""
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.cumsum([len(value) for value in encoded], dtype=np.int64)
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+def _unpack_strings(buffer: np.ndarray, offsets: np.ndarray) -> List[str]:
+    """Decode strings packed by _pack_strings."""
+    data = buffer.tobytes()
+    values = []
+    start = 0
+    for end in offsets.tolist():
+        values.append(data[start:end].decode('utf-8'))
+        start = end
+    return values
 
 class VectorDatabase:
-    def __init__(self, collection_name: str = "basketball_coaching", persist_directory: str = "./chroma_db"):
-        """Initialize the vector database with ChromaDB and sentence transformers."""
-        self.client = chromadb.PersistentClient(path=persist_directory)
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')  # Lightweight multilingual model
+    def __init__(self, collection_name: str = "basketball_coaching", persist_directory: str = "./chroma_db",
+                 client=None):
+        """Initialize the vector database with ChromaDB and sentence transformers.
+        
+        An existing ChromaDB client can be passed in to share it between several collections.
+        """
+        self.client = client if client is not None else chromadb.PersistentClient(path=persist_directory)
         self.collection_name = collection_name
         
         # Get or create collection
@@ -19,16 +63,29 @@ class VectorDatabase:
             self.collection = self.client.create_collection(name=collection_name)
             print(f"Created new collection '{collection_name}'")
     
-    def load_and_index_data(self, json_file_path: str):
-        """Load data from JSON file and index it in the vector database."""
+    @property
+    def model(self):
+        """Sentence transformer model, loaded on first use."""
+        return get_embedding_model()
+    
+    def _build_documents(self, json_file_path: str) -> Tuple[List[str], List[Dict[str, Any]], List[str]]:
+        """Load data from JSON file and turn it into documents, metadatas and ids."""
         with open(json_file_path, 'r', encoding='utf-8') as f:
             data = json.load(f)
         
         documents = []
         metadatas = []
         ids = []
+        seen_ids = set()
         
-        doc_id = 0
+        def add_document(doc_id: str, document: str, metadata: Dict[str, Any]):
+            # Identical documents get identical ids, keep only the first one
+            if doc_id in seen_ids:
+                return
+            seen_ids.add(doc_id)
+            documents.append(document)
+            metadatas.append(metadata)
+            ids.append(doc_id)
         
         for item in data['data']:
             title = item['title']
@@ -37,14 +94,11 @@ class VectorDatabase:
                 context = paragraph['context']
                 
                 # Add the main context
-                documents.append(context)
-                metadatas.append({
+                add_document(_stable_id("context", title, context), context, {
                     "title": title,
                     "type": "context",
                     "source": "coaching_regulations"
                 })
-                ids.append(f"context_{doc_id}")
-                doc_id += 1
                 
                 # Add Q&A pairs for better retrieval
                 for qa in paragraph['qas']:
@@ -57,19 +111,17 @@ class VectorDatabase:
                     else:
                         combined_qa = f"Q: {question}"
                     
-                    documents.append(combined_qa)
-                    metadatas.append({
+                    add_document(_stable_id("qa", title, combined_qa), combined_qa, {
                         "title": title,
                         "type": "qa",
                         "question": question,
                         "source": "coaching_regulations"
                     })
-                    ids.append(f"qa_{doc_id}")
-                    doc_id += 1
-        
-        # Generate embeddings and add to collection
-        print(f"Indexing {len(documents)} documents...")
         
+        return documents, metadatas, ids
+    
+    def _upsert_documents(self, documents: List[str], metadatas: List[Dict[str, Any]], ids: List[str]):
+        """Embed documents and upsert them into the collection in batches."""
         # Add documents in batches to avoid memory issues
         batch_size = 100
         for i in range(0, len(documents), batch_size):
@@ -79,26 +131,185 @@ class VectorDatabase:
             
             embeddings = self.model.encode(batch_docs).tolist()
             
-            self.collection.add(
+            self.collection.upsert(
                 documents=batch_docs,
                 metadatas=batch_meta,
                 ids=batch_ids,
                 embeddings=embeddings
             )
+    
+    def load_and_index_data(self, json_file_path: str):
+        """Load data from JSON file and index it in the vector database.
         
+        Documents no longer in the file, including ones stored under older id schemes,
+        are removed, so the collection ends up matching the file exactly.
+        """
+        documents, metadatas, ids = self._build_documents(json_file_path)
+        
+        # Generate embeddings and add to collection
+        print(f"Indexing {len(documents)} documents...")
+        self._upsert_documents(documents, metadatas, ids)
+        
+        stale_ids = list(set(self.collection.get(include=[])['ids']) - set(ids))
+        if stale_ids:
+            print(f"Removing {len(stale_ids)} stale documents...")
+            self.collection.delete(ids=stale_ids)
         print(f"Successfully indexed {len(documents)} documents!")
     
+    def sync_data(self, json_file_path: str) -> Dict[str, int]:
+        """Bring the collection in line with the JSON file, embedding only new or changed documents."""
+        documents, metadatas, ids = self._build_documents(json_file_path)
+        
+        existing = self.collection.get(include=['documents', 'metadatas'])
+        existing_docs = {
+            doc_id: (doc, meta)
+            for doc_id, doc, meta in zip(existing['ids'], existing['documents'], existing['metadatas'])
+        }
+        
+        changed = [
+            i for i, doc_id in enumerate(ids)
+            if existing_docs.get(doc_id) != (documents[i], metadatas[i])
+        ]
+        stale_ids = list(set(existing_docs) - set(ids))
+        
+        if changed:
+            print(f"Embedding {len(changed)} new or changed documents...")
+            self._upsert_documents(
+                [documents[i] for i in changed],
+                [metadatas[i] for i in changed],
+                [ids[i] for i in changed]
+            )
+        if stale_ids:
+            print(f"Removing {len(stale_ids)} stale documents...")
+            self.collection.delete(ids=stale_ids)
+        
+        return {
+            "upserted": len(changed),
+            "deleted": len(stale_ids),
+            "unchanged": len(ids) - len(changed)
+        }
+    
+    def export_snapshot(self, snapshot_path: str) -> int:
+        """Export the collection to a compressed binary snapshot. Returns the number of documents exported."""
+        data = self.collection.get(include=['embeddings', 'documents', 'metadatas'])
+        
+        ids_bytes, ids_offsets = _pack_strings(data['ids'])
+        documents_bytes, documents_offsets = _pack_strings(data['documents'])
+        metadatas_bytes, metadatas_offsets = _pack_strings(
+            [json.dumps(meta, ensure_ascii=False) for meta in data['metadatas']]
+        )
+        
+        # Embeddings are stored as one contiguous float32 matrix, strings as UTF-8 bytes plus offsets
+        np.savez_compressed(
+            snapshot_path,
+            version=np.array(SNAPSHOT_FORMAT_VERSION),
+            model=np.array(EMBEDDING_MODEL_NAME),
+            embeddings=np.ascontiguousarray(data['embeddings'], dtype=np.float32).reshape(-1, EMBEDDING_DIMENSION),
+            ids=ids_bytes,
+            ids_offsets=ids_offsets,
+            documents=documents_bytes,
+            documents_offsets=documents_offsets,
+            metadatas=metadatas_bytes,
+            metadatas_offsets=metadatas_offsets
+        )
+        return len(data['ids'])
+    
+    @staticmethod
+    def load_snapshot(snapshot_path: str) -> Dict[str, Any]:
+        """Read and validate a snapshot. Raises ValueError if it is incompatible or corrupt."""
+        try:
+            with np.load(snapshot_path, allow_pickle=False) as snapshot:
+                version = int(snapshot['version'])
+                if version != SNAPSHOT_FORMAT_VERSION:
+                    raise ValueError(
+                        f"Snapshot format version {version} is not supported, expected {SNAPSHOT_FORMAT_VERSION}"
+                    )
+                model_name = str(snapshot['model'])
+                if model_name != EMBEDDING_MODEL_NAME:
+                    raise ValueError(
+                        f"Snapshot was built with '{model_name}', expected '{EMBEDDING_MODEL_NAME}'"
+                    )
+                
+                embeddings = snapshot['embeddings']
+                ids = _unpack_strings(snapshot['ids'], snapshot['ids_offsets'])
+                documents = _unpack_strings(snapshot['documents'], snapshot['documents_offsets'])
+                metadatas = [
+                    json.loads(meta)
+                    for meta in _unpack_strings(snapshot['metadatas'], snapshot['metadatas_offsets'])
+                ]
+        except ValueError:
+            raise
+        except Exception as e:  # Truncated or otherwise unreadable archive
+            raise ValueError(f"Could not read snapshot {snapshot_path}: {e}") from e
+        
+        if embeddings.dtype != np.float32 or embeddings.ndim != 2 or embeddings.shape[1] != EMBEDDING_DIMENSION:
+            raise ValueError(f"Snapshot embeddings have unexpected shape {embeddings.shape}")
+        if not len(ids) == len(documents) == len(metadatas) == embeddings.shape[0]:
+            raise ValueError("Snapshot arrays have mismatched lengths")
+        
+        return {"ids": ids, "embeddings": embeddings, "documents": documents, "metadatas": metadatas}
+    
+    def import_snapshot(self, snapshot: Dict[str, Any], replace: bool = False, batch_size: int = 1000) -> int:
+        """Write a loaded snapshot into the collection without loading the embedding model.
+        
+        With replace, the snapshot is written into a temporary collection that is swapped in
+        only once it is complete, so a failed import leaves the live collection untouched.
+        """
+        if replace:
+            temp_name = f"{self.collection_name}__import"
+            try:
+                self.client.delete_collection(name=temp_name)
+            except Exception:  # No leftover from an earlier failed import
+                pass
+            target = self.client.create_collection(name=temp_name)
+        else:
+            target = self.collection
+        
+        ids = snapshot['ids']
+        for i in range(0, len(ids), batch_size):
+            target.upsert(
+                ids=ids[i:i+batch_size],
+                embeddings=snapshot['embeddings'][i:i+batch_size],
+                documents=snapshot['documents'][i:i+batch_size],
+                metadatas=snapshot['metadatas'][i:i+batch_size]
+            )
+        
+        if replace:
+            self.client.delete_collection(name=self.collection_name)
+            target.modify(name=self.collection_name)
+            self.collection = self.client.get_collection(name=self.collection_name)
+        return len(ids)
+    
+    def _encode_query(self, query: str) -> List[float]:
+        """Embed a single query, tokenizing and running the model as separate steps.
+        
+        This is what model.encode() does for one sentence, split up so the profiler can
+        time the tokenizer and the forward pass without doing any work twice.
+        """
+        import torch
+        from sentence_transformers.util import batch_to_device
+        
+        model = self.model
+        with stage("tokenize"):
+            features = model.tokenize([query])
+        with stage("encode"):
+            features = batch_to_device(features, model.device)
+            with torch.no_grad():
+                embedding = model.forward(features)['sentence_embedding']
+        return embedding[0].float().cpu().tolist()
+    
     def search_relevant_context(self, query: str, n_results: int = 3) -> List[Dict[str, Any]]:
         """Search for relevant context based on the query."""
         # Generate embedding for the query
-        query_embedding = self.model.encode([query]).tolist()[0]
+        query_embedding = self._encode_query(query)
         
         # Search in the collection
-        results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=n_results,
-            include=['documents', 'metadatas', 'distances']
-        )
+        with stage("chroma_query"):
+            results = self.collection.query(
+                query_embeddings=[query_embedding],
+                n_results=n_results,
+                include=['documents', 'metadatas', 'distances']
+            )
         
         # Format results
         relevant_docs = []
@@ -114,19 +325,57 @@ class VectorDatabase:
     def get_enhanced_context(self, query: str, max_context_length: int = 1000) -> str:
         """Get relevant context for enhancing the query."""
         relevant_docs = self.search_relevant_context(query, n_results=5)
+        return self.format_context(relevant_docs, max_context_length)
+    
+    def get_incremental_context(self, query: str, previous_docs: List[Dict[str, Any]],
+                                max_context_length: int = 1000,
+                                previous_share: float = 0.4) -> List[Dict[str, Any]]:
+        """Augment the previous turn's context with documents relevant to the new query.
+        
+        The new query is still searched on every turn; reuse means that up to previous_share
+        of the context window is reserved for the previous turn's documents, so follow-up
+        questions keep the context they build on. Space not used by either part is shared.
+        """
+        relevant_docs = self.search_relevant_context(query, n_results=5)
+        
+        new_contents = {doc['content'] for doc in relevant_docs}
+        carried_docs = [doc for doc in previous_docs if doc['content'] not in new_contents]
+        
+        def fill(docs: List[Dict[str, Any]], budget: int, selected: List[Dict[str, Any]]) -> int:
+            # Skip documents that don't fit instead of stopping, a shorter one may still fit
+            used = 0
+            for doc in docs:
+                if doc in selected:
+                    continue
+                length = len(self._format_doc(doc))
+                if used + length <= budget:
+                    selected.append(doc)
+                    used += length
+            return used
         
+        carried = []
+        carried_length = fill(carried_docs, int(max_context_length * previous_share), carried)
+        
+        selected_docs = []
+        new_length = fill(relevant_docs, max_context_length - carried_length, selected_docs)
+        
+        # Give space left over by the new hits to the remaining previous documents
+        fill(carried_docs, max_context_length - new_length - carried_length, carried)
+        
+        return selected_docs + carried
+    
+    def _format_doc(self, doc: Dict[str, Any]) -> str:
+        """Format a single document as a context piece."""
+        title = doc['metadata'].get('title', '')
+        return f"[{title}] {doc['content']}"
+    
+    def format_context(self, relevant_docs: List[Dict[str, Any]], max_context_length: int = 1000) -> str:
+        """Join documents into a context string limited to max_context_length characters."""
         context_parts = []
         current_length = 0
         
         for doc in relevant_docs:
-            content = doc['content']
-            title = doc['metadata'].get('title', '')
-            
-            # Format the context piece
-            if doc['metadata']['type'] == 'context':
-                formatted_content = f"[{title}] {content}"
-            else:
-                formatted_content = f"[{title}] {content}"
+            formatted_content = self._format_doc(doc)
             
             # Check if adding this would exceed max length
             if current_length + len(formatted_content) > max_context_length:
@@ -137,6 +386,11 @@ class VectorDatabase:
         
         return "\n\n".join(context_parts)
     
+    def estimated_index_bytes(self) -> int:
+        """Rough estimate of the memory the collection's index takes once loaded."""
+        # float32 vectors plus about as much again for the HNSW graph and bookkeeping
+        return self.collection.count() * EMBEDDING_DIMENSION * 4 * 2
+    
     def clear_collection(self):
         """Clear all data from the collection."""
         self.client.delete_collection(name=self.collection_name)